@@ -1,6 +1,15 @@
 import socket
 import sys
 
+SOCK_BUF_SIZE = 262144
+RECV_SIZE = 65536
+
+def tune_socket(sock):
+    for opt in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+        if sock.getsockopt(socket.SOL_SOCKET, opt) < SOCK_BUF_SIZE:
+            sock.setsockopt(socket.SOL_SOCKET, opt, SOCK_BUF_SIZE)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
 class DebuggerClient:
     def __init__(self, host='127.0.0.1', port=5000):
         self.host = host
@@ -8,6 +17,7 @@ class DebuggerClient:
         self.sock = None
         self.connected = False
         self.attached_program = None 
+        self.recv_view = memoryview(bytearray(RECV_SIZE))
 
     def connect(self):
         if self.connected:
@@ -17,6 +27,7 @@ class DebuggerClient:
         try:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sock.settimeout(10.0)
+            tune_socket(self.sock)
             self.sock.connect((self.host, self.port))
             self.connected = True
             print("[Client] Connection successful.")
@@ -63,16 +74,16 @@ class DebuggerClient:
                 cmd += '\n'
             self.sock.sendall(cmd.encode())
 
-            response = []
+            buf = bytearray()
             while True:
                 try:
-                    chunk = self.sock.recv(4096)
-                    if not chunk:
+                    n = self.sock.recv_into(self.recv_view)
+                    if not n:
                         print("[Client] Server closed connection.")
                         self.disconnect()
                         return
-                    response.append(chunk)
-                    if chunk.endswith(b'\n'):
+                    buf.extend(self.recv_view[:n])
+                    if buf.endswith(b'\n'):
                         break
                 except socket.timeout:
                     print("[Client] Warning: Timeout waiting for response.")
@@ -82,7 +93,7 @@ class DebuggerClient:
                     self.disconnect()
                     return
 
-            response_text = b''.join(response).decode().strip()
+            response_text = buf.decode('utf-8', 'replace').strip()
             print(response_text)
             
             if cmd_name == "attach" and response_text.startswith("Attached to"):
@@ -1,21 +1,98 @@
+import bisect
+import functools
 import json
+import selectors
 import socket
-import threading
 import traceback
 import os
 
+SOCK_BUF_SIZE = 262144
+RECV_SIZE = 65536
+MAX_LINE_SIZE = 65536
+MAX_PENDING_OUTPUT = 4 * SOCK_BUF_SIZE
+MAX_REPORTED_VARS = 50
+USER_CODE_ERRORS = (Exception, SystemExit)
+
+HELP_TEXT = "\n".join([
+    "Available Commands:",
+    "  help                               - Shows this help message.",
+    "  list_programs                      - Lists all loaded program names.",
+    "  list_breakpoints <program>         - Lists breakpoints for a program.",
+    "  add_breakpoint <program> <line>    - Sets a breakpoint (not available during execution).",
+    "  rmv_breakpoint <program> <line>    - Removes a breakpoint (not available during execution).",
+    "  attach <program>                   - Attaches the debugger to a program.",
+    "  detach                             - Detaches the debugger from the current program.",
+    "  start                              - Starts or restarts execution from the beginning (requires attachment).",
+    "  continue                           - Continues execution from a breakpoint (requires program to be paused).",
+    "  get_var <var_name>                 - Gets the value of a variable in the current context (requires attachment).",
+    "  set_var <var_name> <value>         - Sets the value of a variable in the current context (requires attachment).",
+    "  watch <var_name>                   - Reports only watched variables when the program finishes (requires attachment).",
+    "  unwatch <var_name>                 - Removes a variable from the watch list (requires attachment).",
+    "Client-side commands:",
+    "  disconnect                         - Disconnects from the server.",
+    "  exit                               - Disconnects and exits the client."
+])
+_HELP_BYTES = (HELP_TEXT + "\n").encode()
+
+def tune_socket(sock):
+    for opt in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+        if sock.getsockopt(socket.SOL_SOCKET, opt) < SOCK_BUF_SIZE:
+            sock.setsockopt(socket.SOL_SOCKET, opt, SOCK_BUF_SIZE)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+def describe_error(e):
+    return str(e) if isinstance(e, Exception) else repr(e)
+
+@functools.lru_cache(maxsize=512)
+def compile_expr(src):
+    return compile(src, '<string>', 'eval')
+
 class DebuggerServer:
     def __init__(self, host='127.0.0.1', port=5000):
         self.host = host
         self.port = port
         self.programs = {}
+        self.program_lines = {}
+        self.program_steps = {}
+        self.program_line_steps = {}
+        self._programs_response = "Programs: []"
         self.breakpoints = {}
+        self.breakpoints_sorted = {}
+        self.breakpoints_json_cache = {}
+        self.watches = {}
         self.clients = {}
         self.contexts = {}
         self.debugging = {}
+        self.addr_to_program = {}
         self.executing = set()
         self.paused = set()
         self.states = {}
+        self.addrs = {}
+        self.recv_bufs = {}
+        self.send_bufs = {}
+        self.recv_scans = {}
+        self.closing = set()
+        self.stalled = set()
+        self.at_eof = set()
+        self.recv_view = memoryview(bytearray(RECV_SIZE))
+        self.selector = selectors.DefaultSelector()
+        self._dispatch = {
+            'help': self._cmd_help,
+            'list_programs': self._cmd_list_programs,
+            'list_breakpoints': self._cmd_list_breakpoints,
+            'add_breakpoint': self._cmd_add_breakpoint,
+            'rmv_breakpoint': self._cmd_rmv_breakpoint,
+            'attach': self._cmd_attach,
+            'detach': self._cmd_detach,
+        }
+        self._attached_dispatch = {
+            'start': self._cmd_start,
+            'continue': self._cmd_continue,
+            'get_var': self._cmd_get_var,
+            'set_var': self._cmd_set_var,
+            'watch': self._cmd_watch,
+            'unwatch': self._cmd_unwatch,
+        }
         self.load_programs()
 
     def load_programs(self, folder="programs"):
@@ -28,53 +105,164 @@ class DebuggerServer:
             if file.endswith(".txt"):
                 name = os.path.splitext(file)[0]
                 with open(os.path.join(folder_path, file)) as f:
-                    self.programs[name] = f.read()
+                    content = f.read()
+                self.programs[name] = content
+                lines = [ln.strip() for ln in content.splitlines()]
+                self.program_lines[name] = lines
+                self.program_steps[name] = [
+                    (i, self.compile_line(ln)) for i, ln in enumerate(lines)
+                    if ln and not ln.startswith('#')
+                ]
+                self.program_line_steps[name] = {idx: i for i, (idx, _) in enumerate(self.program_steps[name])}
                 print(f"[Server] Loaded '{name}'")
+        self._programs_response = f"Programs: {json.dumps(sorted(self.programs.keys()))}"
+
+    def compile_line(self, line):
+        try:
+            return compile(line, '<prog>', 'exec')
+        except SyntaxError:
+            return line
 
-    def handle_client(self, conn, addr):
+    def accept_client(self, sock):
+        conn, addr = sock.accept()
+        conn.setblocking(False)
+        tune_socket(conn)
         print(f"[Server] Connected: {addr}")
         self.clients[addr] = conn
+        self.addrs[conn.fileno()] = addr
+        self.recv_bufs[conn.fileno()] = bytearray()
+        self.recv_scans[conn.fileno()] = 0
+        self.send_bufs[conn.fileno()] = bytearray()
+        self.selector.register(conn, selectors.EVENT_READ)
+
+    def service_client(self, fd, mask):
         try:
-            while True:
-                data = conn.recv(4096).decode().strip()
-                if not data:
-                    break
-                print(f"[Server] From {addr}: {data}")
-                resp = self.process_command(data, addr)
-                print(f"[Server] To {addr}: {resp[:100]}{'...' if len(resp) > 100 else ''}")
-                conn.sendall((resp + '\n').encode())
+            if mask & selectors.EVENT_READ and not self.backed_up(fd):
+                self.read_client(fd)
+            if mask & selectors.EVENT_WRITE and fd in self.addrs:
+                self.write_client(fd)
+                if fd in self.stalled and len(self.send_bufs[fd]) <= MAX_PENDING_OUTPUT:
+                    self.process_pending(fd)
+        except OSError as e:
+            print(f"[Server] Connection error for {self.addrs.get(fd)}: {e}")
+            if fd in self.addrs:
+                self.close_client(fd)
         except Exception:
             traceback.print_exc()
-        finally:
-            if addr in self.clients:
-                del self.clients[addr]
-            for program, user in list(self.debugging.items()):
-                if user == addr:
-                    del self.debugging[program]
-                    if program in self.executing:
-                        self.executing.discard(program)
-                    if program in self.paused:
-                        self.paused.discard(program)
-            conn.close()
+            if fd in self.addrs:
+                self.close_client(fd)
+
+    def read_client(self, fd):
+        conn = self.clients[self.addrs[fd]]
+        try:
+            n = conn.recv_into(self.recv_view)
+        except BlockingIOError:
+            return
+        if n:
+            self.recv_bufs[fd].extend(self.recv_view[:n])
+        else:
+            self.at_eof.add(fd)
+        self.process_pending(fd)
+
+    def process_pending(self, fd):
+        addr = self.addrs[fd]
+        buf = self.recv_bufs[fd]
+        out = self.send_bufs[fd]
+        scan = self.recv_scans[fd]
+        self.stalled.discard(fd)
+        while True:
+            if len(out) > MAX_PENDING_OUTPUT:
+                self.stalled.add(fd)
+                break
+            nl = buf.find(b'\n', scan)
+            if nl < 0:
+                scan = len(buf)
+                break
+            self.handle_line(fd, addr, buf[:nl])
+            del buf[:nl + 1]
+            scan = 0
+        self.recv_scans[fd] = scan
+
+        if fd not in self.stalled:
+            if fd in self.at_eof:
+                if buf:
+                    self.handle_line(fd, addr, buf)
+                    buf.clear()
+                self.closing.add(fd)
+            elif len(buf) > MAX_LINE_SIZE:
+                print(f"[Server] Line from {addr} exceeds {MAX_LINE_SIZE} bytes, closing.")
+                buf.clear()
+                out.extend(b"Error: Command too long.\n")
+                self.closing.add(fd)
+        if fd in self.closing or out:
+            self.write_client(fd)
+
+    def handle_line(self, fd, addr, line):
+        data = line.decode('utf-8', 'replace').strip()
+        if not data:
+            return
+        print(f"[Server] From {addr}: {data}")
+        if data.lower() == 'help':
+            self.send_bufs[fd].extend(_HELP_BYTES)
+            return
+        resp = self.process_command(data, addr)
+        print(f"[Server] To {addr}: {resp[:100]}{'...' if len(resp) > 100 else ''}")
+        self.send_bufs[fd].extend(resp.encode())
+        self.send_bufs[fd].append(0x0A)
+
+    def write_client(self, fd):
+        conn = self.clients[self.addrs[fd]]
+        buf = self.send_bufs[fd]
+        if buf:
+            try:
+                n = conn.send(buf)
+            except BlockingIOError:
+                n = 0
+            del buf[:n]
+        if fd in self.closing:
+            if buf:
+                self.set_events(conn, selectors.EVENT_WRITE)
+            else:
+                self.close_client(fd)
+        elif self.backed_up(fd):
+            self.set_events(conn, selectors.EVENT_WRITE)
+        elif buf:
+            self.set_events(conn, selectors.EVENT_READ | selectors.EVENT_WRITE)
+        else:
+            self.set_events(conn, selectors.EVENT_READ)
+
+    def backed_up(self, fd):
+        return fd in self.stalled or len(self.send_bufs[fd]) > MAX_PENDING_OUTPUT
+
+    def set_events(self, conn, events):
+        if self.selector.get_key(conn).events != events:
+            self.selector.modify(conn, events)
+
+    def close_client(self, fd):
+        addr = self.addrs.pop(fd)
+        conn = self.clients.pop(addr)
+        del self.recv_bufs[fd]
+        del self.send_bufs[fd]
+        del self.recv_scans[fd]
+        self.closing.discard(fd)
+        self.stalled.discard(fd)
+        self.at_eof.discard(fd)
+        self.selector.unregister(conn)
+        self.release_program(addr)
+        conn.close()
+        print(f"[Server] Disconnected: {addr}")
+
+    def release_program(self, addr):
+        program = self.addr_to_program.pop(addr, None)
+        if program is not None:
+            del self.debugging[program]
+            self.watches.pop(program, None)
+            self.executing.discard(program)
+            self.paused.discard(program)
+        return program
 
     def help_text(self):
-        return "\n".join([
-            "Available Commands:",
-            "  help                               - Shows this help message.",
-            "  list_programs                      - Lists all loaded program names.",
-            "  list_breakpoints <program>         - Lists breakpoints for a program.",
-            "  add_breakpoint <program> <line>    - Sets a breakpoint (not available during execution).",
-            "  rmv_breakpoint <program> <line>    - Removes a breakpoint (not available during execution).",
-            "  attach <program>                   - Attaches the debugger to a program.",
-            "  detach                             - Detaches the debugger from the current program.",
-            "  start                              - Starts or restarts execution from the beginning (requires attachment).",
-            "  continue                           - Continues execution from a breakpoint (requires program to be paused).",
-            "  get_var <var_name>                 - Gets the value of a variable in the current context (requires attachment).",
-            "  set_var <var_name> <value>         - Sets the value of a variable in the current context (requires attachment).",
-            "Client-side commands:",   
-            "  disconnect                         - Disconnects from the server.",
-            "  exit                               - Disconnects and exits the client."
-        ])
+        return HELP_TEXT
 
     def process_command(self, cmd, addr):
         parts = cmd.split(maxsplit=1)
@@ -82,110 +270,148 @@ class DebuggerServer:
             return 'Error: Invalid command.'
         name, args = parts[0].lower(), parts[1] if len(parts) > 1 else ""
 
-        if name == 'help':
-            return self.help_text()
-        if name == 'list_programs':
-            return f"Programs: {json.dumps(list(self.programs.keys()))}"
-        if name == 'list_breakpoints':
-            program = args
-            if program not in self.breakpoints:
-                return f"Error: Program '{program}' not found."
-            breakpoints = sorted(self.breakpoints[program])
-            return f"Breakpoints in '{program}': {json.dumps(breakpoints)}"
-
-        if name == 'add_breakpoint':
-            args = args.split()
-            if len(args) != 2:
-                return 'Error: Format add_breakpoint <program> <line>'
-            program, line = args
-            if program not in self.programs:
-                return f"Error: Program '{program}' not found."
-            if program in self.executing or program in self.paused:
-                return f"Error: '{program}' is currently executing."
-            try:
-                self.breakpoints.setdefault(program, set()).add(int(line))
-                return f"Breakpoint set at line {line} in '{program}'."
-            except:
-                return "Error: Line must be integer."
-
-        if name == 'rmv_breakpoint':
-            args = args.split()
-            if len(args) != 2:
-                return 'Error: Format rmv_breakpoint <program> <line>'
-            program, line = args
-            if program not in self.programs:
-                return f"Error: Program '{program}' not found."
-            if program in self.executing or program in self.paused:
-                return f"Error: '{program}' is currently executing."
-            try:
-                self.breakpoints.setdefault(program, set()).discard(int(line))
-                return f"Breakpoint removed from line {line} in '{program}'."
-            except:
-                return "Error: Line must be integer."
-
-        if name == 'attach':
-            program = args
-            if not program or program not in self.programs:
-                return f"Error: Program '{program}' not found."
-            if program in self.debugging:
-                return f"Error: '{program}' is already debugged."
-            for p, a in self.debugging.items():
-                if a == addr:
-                    return f"Error: You are already debugging '{p}'."
-            self.debugging[program] = addr
-            if program not in self.states:
-                self.contexts[program] = {}
-                self.states[program] = (0, self.contexts[program])
-            return f"Attached to '{program}'"
-
-        if name == 'detach':
-            for p, a in list(self.debugging.items()):
-                if a == addr:
-                    del self.debugging[p]
-                    if p in self.executing:
-                        self.executing.discard(p)
-                    if p in self.paused:
-                        self.paused.discard(p)
-                    return f"Detached from '{p}'"
-            return "Not attached."
-
-        program = None
-        for p, a in self.debugging.items():
-            if a == addr:
-                program = p
-                break
+        handler = self._dispatch.get(name)
+        if handler:
+            return handler(args, addr)
 
+        program = self.addr_to_program.get(addr)
         if not program:
             return f"Error: '{name}' needs attachment."
 
-        if name == 'start':
-            return self.run(program)
-            
-        if name == 'continue':
-            if program not in self.paused:
-                return f"Error: '{program}' is not paused at a breakpoint. Use 'start' first."
-            return self.cont(program)
-
-        if name == 'get_var':
-            var = args
-            ctx = self.contexts.get(program, {})
-            if var in ctx:
-                return f"{var} = {repr(ctx[var])}"
+        handler = self._attached_dispatch.get(name)
+        if handler:
+            return handler(args, program)
+        return f"Error: Unknown command '{name}'"
+
+    def _cmd_help(self, args, addr):
+        return self.help_text()
+
+    def _cmd_list_programs(self, args, addr):
+        return self._programs_response
+
+    def _cmd_list_breakpoints(self, args, addr):
+        program = args
+        resp = self.breakpoints_json_cache.get(program)
+        if resp is None:
+            return f"Error: Program '{program}' not found."
+        return resp
+
+    def _cmd_add_breakpoint(self, args, addr):
+        args = args.split()
+        if len(args) != 2:
+            return 'Error: Format add_breakpoint <program> <line>'
+        program, line = args
+        if program not in self.programs:
+            return f"Error: Program '{program}' not found."
+        if program in self.executing or program in self.paused:
+            return f"Error: '{program}' is currently executing."
+        if not line.removeprefix('-').isdecimal():
+            return "Error: Line must be integer."
+        bps = self.breakpoints.setdefault(program, set())
+        line_i = int(line)
+        if line_i not in bps:
+            bps.add(line_i)
+            bisect.insort(self.breakpoints_sorted.setdefault(program, []), line_i)
+        self.update_breakpoints_response(program)
+        return f"Breakpoint set at line {line} in '{program}'."
+
+    def _cmd_rmv_breakpoint(self, args, addr):
+        args = args.split()
+        if len(args) != 2:
+            return 'Error: Format rmv_breakpoint <program> <line>'
+        program, line = args
+        if program not in self.programs:
+            return f"Error: Program '{program}' not found."
+        if program in self.executing or program in self.paused:
+            return f"Error: '{program}' is currently executing."
+        if not line.removeprefix('-').isdecimal():
+            return "Error: Line must be integer."
+        bps = self.breakpoints.setdefault(program, set())
+        line_i = int(line)
+        if line_i in bps:
+            bps.discard(line_i)
+            self.breakpoints_sorted[program].remove(line_i)
+        self.update_breakpoints_response(program)
+        return f"Breakpoint removed from line {line} in '{program}'."
+
+    def update_breakpoints_response(self, program):
+        bps = self.breakpoints_sorted.setdefault(program, [])
+        self.breakpoints_json_cache[program] = f"Breakpoints in '{program}': [{', '.join(map(str, bps))}]"
+
+    def _cmd_attach(self, args, addr):
+        program = args
+        if not program or program not in self.programs:
+            return f"Error: Program '{program}' not found."
+        if program in self.debugging:
+            return f"Error: '{program}' is already debugged."
+        if addr in self.addr_to_program:
+            return f"Error: You are already debugging '{self.addr_to_program[addr]}'."
+        self.debugging[program] = addr
+        self.addr_to_program[addr] = program
+        if program not in self.states:
+            self.contexts[program] = {}
+            self.states[program] = (0, self.contexts[program])
+        return f"Attached to '{program}'"
+
+    def _cmd_detach(self, args, addr):
+        p = self.release_program(addr)
+        if p is None:
+            return "Not attached."
+        return f"Detached from '{p}'"
+
+    def _cmd_start(self, args, program):
+        return self.run(program)
+
+    def _cmd_continue(self, args, program):
+        if program not in self.paused:
+            return f"Error: '{program}' is not paused at a breakpoint. Use 'start' first."
+        return self.cont(program)
+
+    def _cmd_get_var(self, args, program):
+        var = args
+        ctx = self.contexts.get(program, {})
+        if var not in ctx:
             return f"{var} not found."
+        try:
+            return f"{var} = {repr(ctx[var])}"
+        except USER_CODE_ERRORS as e:
+            return f"Error: {describe_error(e)}"
 
-        if name == 'set_var':
-            parts = args.split(maxsplit=1)
-            if len(parts) != 2:
-                return "Error: Format set_var <name> <value>"
-            var, val = parts
-            try:
-                val = eval(val, globals(), self.contexts[program])
-                self.contexts[program][var] = val
-                return f"{var} set to {repr(val)}"
-            except Exception as e:
-                return f"Error: {e}"
+    def _cmd_set_var(self, args, program):
+        parts = args.split(maxsplit=1)
+        if len(parts) != 2:
+            return "Error: Format set_var <name> <value>"
+        var, val = parts
+        try:
+            val = eval(compile_expr(val), globals(), self.contexts[program])
+            self.contexts[program][var] = val
+            return f"{var} set to {repr(val)}"
+        except USER_CODE_ERRORS as e:
+            return f"Error: {describe_error(e)}"
 
-        return f"Error: Unknown command '{name}'"
+    def _cmd_watch(self, args, program):
+        var = args
+        if not var:
+            return "Error: Format watch <var_name>"
+        self.watches.setdefault(program, set()).add(var)
+        return f"Watching '{var}' in '{program}'."
+
+    def _cmd_unwatch(self, args, program):
+        var = args
+        if var not in self.watches.get(program, ()):
+            return f"Error: '{var}' is not watched."
+        self.watches[program].discard(var)
+        return f"Stopped watching '{var}' in '{program}'."
+
+    def report_vars(self, program, ctx):
+        watched = self.watches.get(program)
+        if watched:
+            names = sorted(k for k in watched if k in ctx)
+        else:
+            names = [k for k in ctx if not k.startswith('__')]
+        vars = {k: repr(ctx[k]) for k in names[:MAX_REPORTED_VARS]}
+        hidden = len(names) - len(vars)
+        return f"{vars} (+{hidden} more)" if hidden > 0 else f"{vars}"
 
     def run(self, program):
         self.executing.add(program)
@@ -194,6 +420,18 @@ class DebuggerServer:
         self.states[program] = (0, self.contexts[program])
         return self.cont(program)
 
+    def next_stop(self, program, step):
+        steps = self.program_steps[program]
+        if step >= len(steps):
+            return len(steps), None
+        bps = self.breakpoints_sorted.get(program, ())
+        line_steps = self.program_line_steps[program]
+        for i in range(bisect.bisect_left(bps, steps[step][0] + 2), len(bps)):
+            stop = line_steps.get(bps[i] - 2)
+            if stop is not None:
+                return stop + 1, bps[i]
+        return len(steps), None
+
     def cont(self, program):
         if program not in self.states:
             return "Error: Start first."
@@ -201,31 +439,30 @@ class DebuggerServer:
         self.executing.add(program)
         self.paused.discard(program)
         
-        lines = self.programs[program].splitlines()
-        idx, ctx = self.states[program]
+        lines = self.program_lines[program]
+        steps = self.program_steps[program]
+        step, ctx = self.states[program]
+        stop, bp = self.next_stop(program, step)
         try:
-            while idx < len(lines):
-                line = lines[idx].strip()
-                idx += 1
-                if not line or line.startswith('#'):
-                    continue
-                exec(line, globals(), ctx)
-                if program in self.breakpoints and (idx + 1) in self.breakpoints[program]:
-                    self.states[program] = (idx, ctx)
-                    self.executing.discard(program)
-                    self.paused.add(program)
-                    return f"Breakpoint at line {idx + 1}: {lines[idx].strip() if idx < len(lines) else 'end of program'}"
-            
+            while step < stop:
+                idx, code = steps[step]
+                step += 1
+                exec(code, globals(), ctx)
+            if bp is not None:
+                self.states[program] = (step, ctx)
+                self.executing.discard(program)
+                self.paused.add(program)
+                return f"Breakpoint at line {bp}: {lines[bp - 1] if bp - 1 < len(lines) else 'end of program'}"
+
             self.executing.discard(program)
             self.paused.discard(program)
             
-            self.states[program] = (idx, ctx)
-            vars = {k: repr(v) for k, v in ctx.items() if not k.startswith('__')}
-            return f"Finished '{program}'. Vars: {vars}"
-        except Exception as e:
+            self.states[program] = (step, ctx)
+            return f"Finished '{program}'. Vars: {self.report_vars(program, ctx)}"
+        except USER_CODE_ERRORS as e:
             self.executing.discard(program)
             self.paused.discard(program)
-            return f"Error on line {idx}: {e}"
+            return f"Error on line {idx + 1}: {describe_error(e)}"
 
     def start(self):
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -233,13 +470,22 @@ class DebuggerServer:
         try:
             s.bind((self.host, self.port))
             s.listen(5)
+            s.setblocking(False)
+            self.selector.register(s, selectors.EVENT_READ)
             print(f"[Server] Running on {self.host}:{self.port}")
             while True:
-                conn, addr = s.accept()
-                threading.Thread(target=self.handle_client, args=(conn, addr), daemon=True).start()
+                for key, mask in self.selector.select():
+                    if key.fileobj is not s:
+                        self.service_client(key.fd, mask)
+                        continue
+                    try:
+                        self.accept_client(s)
+                    except OSError as e:
+                        print(f"[Server] Accept failed: {e}")
         except Exception as e:
             print(f"[Server] Fatal: {e}")
         finally:
+            self.selector.close()
             s.close()
 
 if __name__ == '__main__':